@@ -17,17 +17,29 @@ The server follows MCP specifications and uses the Python MCP SDK.
 The server is designed to be run as a standalone script.
 """
 
+import asyncio
+import functools
+import hashlib
+import json
 import logging
 import os
-from datetime import datetime, timedelta
+import random
+import re
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
 from http import HTTPStatus
-from typing import Any
+from typing import Any, TypeVar
 
 import httpx
 from mcp.server.fastmcp import FastMCP
 
 # Import formatting utilities
 from utils.formatting import (
+    format_activities,
     format_activity_summary,
     format_event_details,
     format_event_summary,
@@ -44,6 +56,15 @@ except ImportError:
     # python-dotenv not installed, proceed without it
     pass
 
+# Use orjson to parse API responses if it is installed, it is several times
+# faster than the standard library on large wellness and intervals payloads
+try:
+    import orjson
+
+    json_loads: Callable[[bytes], Any] = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -52,9 +73,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger("intervals_icu_mcp_server")
 
-# Initialize FastMCP server
-mcp = FastMCP("intervals-icu")
-
 # Constants
 INTERVALS_API_BASE_URL = os.getenv(
     "INTERVALS_API_BASE_URL", "https://intervals.icu/api/v1"
@@ -62,62 +80,539 @@ INTERVALS_API_BASE_URL = os.getenv(
 API_KEY = os.getenv("API_KEY", "")  # Provide default empty string
 ATHLETE_ID = os.getenv("ATHLETE_ID", "")  # Default athlete ID from .env
 USER_AGENT = "intervalsicu-mcp-server/1.0"
+# get_activities fetches the older top-up window up front above this page size.
+# It is well above the default limit of 10, so ordinary calls make the second
+# request only when the first window is short of named activities
+ACTIVITIES_PREFETCH_MIN_LIMIT = 25
+ATHLETE_ID_PATTERN = re.compile(r"i?\d+")  # e.g. i12345
+
+# Shared HTTP client: every tool talks to the same host, so keep the TCP/TLS
+# connections alive between calls and multiplex concurrent requests over HTTP/2
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client, creating it on first use or after it was closed."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            base_url=INTERVALS_API_BASE_URL,
+            headers={
+                "User-Agent": USER_AGENT,
+                "Accept": "application/json",
+            },
+            auth=httpx.BasicAuth("API_KEY", API_KEY),
+            limits=httpx.Limits(
+                max_keepalive_connections=32, max_connections=64, keepalive_expiry=30.0
+            ),
+            # Fail fast when the API is unreachable or the pool is exhausted,
+            # but give large responses time to arrive
+            timeout=httpx.Timeout(connect=5.0, read=30.0, write=10.0, pool=5.0),
+        )
+    return _http_client
+
+
+# The SSE and streamable HTTP transports enter the lifespan once per session,
+# so the shared client may only be closed when the last session ends
+_active_lifespans = 0
+
+
+@asynccontextmanager
+async def lifespan(_server: FastMCP) -> AsyncIterator[None]:
+    """Close the shared HTTP client when the last session using it ends."""
+    global _active_lifespans
+    _active_lifespans += 1
+    try:
+        yield
+    finally:
+        _active_lifespans -= 1
+        if _active_lifespans == 0 and _http_client is not None:
+            await _http_client.aclose()
 
 
-async def make_intervals_request(
-    url: str, api_key: str | None = None, params: dict[str, Any] | None = None
-) -> dict[str, Any] | list[dict[str, Any]]:
-    """Make a GET request to the Intervals.icu API with proper error handling."""
+# Initialize FastMCP server
+mcp = FastMCP("intervals-icu", lifespan=lifespan)
+
+
+@dataclass(slots=True)
+class ApiError:
+    """Error returned by make_intervals_request instead of a response body."""
+
+    message: str
+    status_code: int | None = None
+
+
+# User-friendly messages for common HTTP error codes
+ERROR_MESSAGES: dict[int, str] = {
+    status.value: f"{status.value} {status.phrase}: {detail}"
+    for status, detail in (
+        (HTTPStatus.UNAUTHORIZED, "Please check your API key."),
+        (
+            HTTPStatus.FORBIDDEN,
+            "You may not have permission to access this resource.",
+        ),
+        (HTTPStatus.NOT_FOUND, "The requested endpoint or ID doesn't exist."),
+        (
+            HTTPStatus.UNPROCESSABLE_ENTITY,
+            "The server couldn't process the request (invalid parameters or unsupported operation).",
+        ),
+        (HTTPStatus.TOO_MANY_REQUESTS, "Too many requests in a short time period."),
+        (
+            HTTPStatus.INTERNAL_SERVER_ERROR,
+            "The Intervals.icu server encountered an internal error.",
+        ),
+        (
+            HTTPStatus.SERVICE_UNAVAILABLE,
+            "The Intervals.icu server might be down or undergoing maintenance.",
+        ),
+    )
+}
+
+# Message prefixes for failures other than HTTP error statuses, most specific first
+# (orjson.JSONDecodeError is a subclass of json.JSONDecodeError)
+EXCEPTION_PREFIXES: tuple[tuple[type[Exception], str], ...] = (
+    (httpx.RequestError, "Request error"),
+    (json.JSONDecodeError, "Invalid JSON response"),
+)
+
+# Retry transient failures with exponential backoff and jitter
+MAX_RETRIES = 2
+RETRY_BACKOFF_BASE = 0.5  # seconds
+RETRY_BACKOFF_CAP = 8.0  # seconds
+RETRY_STATUS_CODES = frozenset(
+    {
+        HTTPStatus.TOO_MANY_REQUESTS,
+        HTTPStatus.BAD_GATEWAY,
+        HTTPStatus.SERVICE_UNAVAILABLE,
+        HTTPStatus.GATEWAY_TIMEOUT,
+    }
+)
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+
+# Client-side rate limit shared by all tools, to stay clear of 429 responses
+RATE_LIMIT_PER_SECOND = 10.0
+RATE_LIMIT_BURST = 20
+
+
+class TokenBucket:
+    """Token bucket that paces requests to the API from every tool."""
+
+    __slots__ = ("capacity", "lock", "rate", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it."""
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for at least the given number of seconds."""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+rate_limiter = TokenBucket(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+
+# LRU response cache for GET requests, keyed by (url, params, api key digest)
+CACHE_MAXSIZE = 512
+CACHE_DEFAULT_TTL = 30.0  # seconds, for date range listings that change often
+# How long past its TTL a response may still be served while the API is failing
+CACHE_MAX_STALE = 3600.0
+STALE_NOTICE = "Intervals.icu is unavailable; showing cached data.\n\n"
+# Finished activities and their intervals rarely change, single events change
+# less often than the listings they appear in
+CACHE_TTLS: tuple[tuple[re.Pattern[str], float], ...] = (
+    (re.compile(r"^/activity/[^/]+(/intervals)?$"), 300.0),
+    (re.compile(r"^/athlete/[^/]+/event/[^/]+$"), 60.0),
+)
 
-    headers = {"User-Agent": USER_AGENT, "Accept": "application/json"}
 
-    # Use provided api_key or fall back to global API_KEY
-    key_to_use = api_key if api_key is not None else API_KEY
-    auth = httpx.BasicAuth("API_KEY", key_to_use)
-    full_url = f"{INTERVALS_API_BASE_URL}{url}"
+@dataclass(slots=True)
+class CacheEntry:
+    """A cached response body together with its revalidation headers."""
+
+    expires_at: float
+    data: dict[str, Any] | list[dict[str, Any]]
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+# Expired entries are kept until evicted so they can be revalidated with a
+# conditional request, or served when the API is failing
+_cache: OrderedDict[tuple[Any, ...], CacheEntry] = OrderedDict()
+# Requests currently in flight, keyed like the cache
+_inflight: dict[tuple[Any, ...], asyncio.Future[Any]] = {}
+
+T = TypeVar("T")
+
+
+def _cache_key(
+    url: str, api_key: str | None, params: dict[str, Any] | None
+) -> tuple[Any, ...]:
+    """Build a cache key that never holds the raw API key."""
+    key_digest = hashlib.blake2b(
+        (api_key if api_key is not None else API_KEY).encode(), digest_size=16
+    ).hexdigest()
+    return (url, tuple(sorted((params or {}).items())), key_digest)
+
+
+def _cache_ttl(url: str) -> float:
+    """Return how long a successful response for this URL stays fresh."""
+    for pattern, ttl in CACHE_TTLS:
+        if pattern.match(url):
+            return ttl
+    return CACHE_DEFAULT_TTL
+
+
+def _cache_store(key: tuple[Any, ...], entry: CacheEntry) -> None:
+    """Store a cache entry, evicting the least recently used one when full."""
+    _cache[key] = entry
+    _cache.move_to_end(key)
+    if len(_cache) > CACHE_MAXSIZE:
+        _ = _cache.popitem(last=False)
+
+
+def _conditional_headers(entry: CacheEntry | None) -> dict[str, str]:
+    """Return the headers to revalidate an expired cache entry."""
+    headers: dict[str, str] = {}
+    if entry is not None:
+        if entry.etag is not None:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified is not None:
+            headers["If-Modified-Since"] = entry.last_modified
+    return headers
+
+
+def _exception_error(e: Exception) -> ApiError:
+    """Build the ApiError for an exception raised while making a request."""
+    prefix = next(
+        (prefix for cls, prefix in EXCEPTION_PREFIXES if isinstance(e, cls)),
+        "Unexpected error",
+    )
+    logger.error("%s: %s", prefix, str(e))
+    return ApiError(message=f"{prefix}: {str(e)}")
 
-    async with httpx.AsyncClient() as client:
+
+def _retry_after_seconds(header: str | None) -> float | None:
+    """Parse a Retry-After header given in seconds, or return None."""
+    if header is None:
+        return None
+    try:
+        return max(0.0, float(header))
+    except ValueError:
+        # HTTP-date form, callers fall back to exponential backoff
+        return None
+
+
+def _retry_delay(attempt: int, retry_after: float | None = None) -> float:
+    """Return the seconds to wait before retrying after the given failed attempt.
+
+    A Retry-After value is honored, otherwise the delay grows exponentially
+    with jitter. Either way it is capped at RETRY_BACKOFF_CAP.
+    """
+    if retry_after is not None:
+        return min(RETRY_BACKOFF_CAP, retry_after)
+    delay = min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_BASE * 2**attempt)
+    return delay * (0.5 + random.random() / 2)
+
+
+def _status_error(status_code: int, text: str) -> ApiError:
+    """Build the ApiError for a response with an unsuccessful HTTP status."""
+    logger.error("HTTP error: %s - %s", status_code, text)
+
+    # Use a specific message for common error codes or default to the server's response
+    return ApiError(
+        status_code=status_code, message=ERROR_MESSAGES.get(status_code, text)
+    )
+
+
+async def _send_request(
+    url: str,
+    api_key: str | None,
+    params: dict[str, Any] | None,
+    headers: dict[str, str],
+) -> httpx.Response | ApiError:
+    """Send a GET request, retrying transient failures.
+
+    Returns the response when it is successful or 304 Not Modified.
+    """
+
+    # The shared client authenticates with the global API_KEY; only override it
+    # when the caller supplies a different key
+    auth = (
+        httpx.BasicAuth("API_KEY", api_key)
+        if api_key is not None
+        else httpx.USE_CLIENT_DEFAULT
+    )
+
+    attempt = 0
+    while True:
+        await rate_limiter.acquire()
         try:
-            response = await client.get(
-                full_url, headers=headers, params=params, auth=auth, timeout=30.0
+            response = await get_http_client().get(
+                url, params=params, headers=headers, auth=auth
             )
 
-            # Assign to _ to indicate intentional ignoring of return value
-            _ = response.raise_for_status()
-            return response.json() if response.content else {}
-
-        except httpx.HTTPStatusError as e:
-            error_code = e.response.status_code
-            error_text = e.response.text
-
-            logger.error("HTTP error: %s - %s", error_code, error_text)
-
-            # Provide specific messages for common error codes
-            error_messages = {
-                HTTPStatus.UNAUTHORIZED: f"{HTTPStatus.UNAUTHORIZED.value} {HTTPStatus.UNAUTHORIZED.phrase}: Please check your API key.",
-                HTTPStatus.FORBIDDEN: f"{HTTPStatus.FORBIDDEN.value} {HTTPStatus.FORBIDDEN.phrase}: You may not have permission to access this resource.",
-                HTTPStatus.NOT_FOUND: f"{HTTPStatus.NOT_FOUND.value} {HTTPStatus.NOT_FOUND.phrase}: The requested endpoint or ID doesn't exist.",
-                HTTPStatus.UNPROCESSABLE_ENTITY: f"{HTTPStatus.UNPROCESSABLE_ENTITY.value} {HTTPStatus.UNPROCESSABLE_ENTITY.phrase}: The server couldn't process the request (invalid parameters or unsupported operation).",
-                HTTPStatus.TOO_MANY_REQUESTS: f"{HTTPStatus.TOO_MANY_REQUESTS.value} {HTTPStatus.TOO_MANY_REQUESTS.phrase}: Too many requests in a short time period.",
-                HTTPStatus.INTERNAL_SERVER_ERROR: f"{HTTPStatus.INTERNAL_SERVER_ERROR.value} {HTTPStatus.INTERNAL_SERVER_ERROR.phrase}: The Intervals.icu server encountered an internal error.",
-                HTTPStatus.SERVICE_UNAVAILABLE: f"{HTTPStatus.SERVICE_UNAVAILABLE.value} {HTTPStatus.SERVICE_UNAVAILABLE.phrase}: The Intervals.icu server might be down or undergoing maintenance.",
-            }
-
-            # Get a specific message or default to the server's response
-            try:
-                status = HTTPStatus(error_code)
-                custom_message = error_messages.get(status, error_text)
-            except ValueError:
-                # If the status code doesn't map to HTTPStatus, use the error_text
-                custom_message = error_text
-
-            return {"error": True, "status_code": error_code, "message": custom_message}
-        except httpx.RequestError as e:
-            logger.error("Request error: %s", str(e))
-            return {"error": True, "message": f"Request error: {str(e)}"}
+            if response.is_success or response.status_code == HTTPStatus.NOT_MODIFIED:
+                return response
+            if response.status_code not in RETRY_STATUS_CODES:
+                return _status_error(response.status_code, response.text)
+
+            # Draw the jittered delay once so the shared pause and this
+            # request's retry wait for the same time
+            retry_after = _retry_after_seconds(response.headers.get("Retry-After"))
+            delay = _retry_delay(attempt, retry_after)
+            if response.status_code == HTTPStatus.TOO_MANY_REQUESTS:
+                # Hold back every request, not just this one, for as long as
+                # the API asked
+                rate_limiter.pause(retry_after if retry_after is not None else delay)
+            # Give up rather than retry before the API is ready to accept it
+            if attempt >= MAX_RETRIES or (
+                retry_after is not None and retry_after > RETRY_BACKOFF_CAP
+            ):
+                return _status_error(response.status_code, response.text)
+        except RETRY_EXCEPTIONS as e:
+            if attempt >= MAX_RETRIES:
+                return _exception_error(e)
+            delay = _retry_delay(attempt)
         except Exception as e:
-            logger.error("Unexpected error: %s", str(e))
-            return {"error": True, "message": f"Unexpected error: {str(e)}"}
+            return _exception_error(e)
+
+        # Back off without blocking the event loop so other tool calls keep running
+        logger.warning(
+            "Transient failure requesting %s, retrying in %.2f seconds", url, delay
+        )
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def _fetch(
+    key: tuple[Any, ...],
+    url: str,
+    api_key: str | None,
+    params: dict[str, Any] | None,
+    stale: CacheEntry | None,
+) -> tuple[dict[str, Any] | list[dict[str, Any]] | ApiError, bool]:
+    """Fetch a response from the API and cache it, revalidating a stale entry.
+
+    Returns the response and whether it is a stale cached body served because
+    the API is failing.
+    """
+    response = await _send_request(url, api_key, params, _conditional_headers(stale))
+
+    if isinstance(response, ApiError):
+        # Better to answer with slightly old data than nothing while the API is
+        # down or unreachable, as long as it isn't too old
+        if (
+            stale is not None
+            and (response.status_code is None or response.status_code >= 500)
+            and time.monotonic() - stale.expires_at <= CACHE_MAX_STALE
+        ):
+            logger.warning("Serving stale cached response for %s", url)
+            return stale.data, True
+        return response, False
+
+    expires_at = time.monotonic() + _cache_ttl(url)
+    if response.status_code == HTTPStatus.NOT_MODIFIED and stale is not None:
+        # The cached body is still current, keep it without downloading it again
+        stale.expires_at = expires_at
+        _cache_store(key, stale)
+        return stale.data, False
+
+    try:
+        data = json_loads(response.content) if response.content else {}
+    # JSONDecodeError, including orjson's, and UnicodeDecodeError
+    except ValueError as e:
+        return _exception_error(e), False
+
+    _cache_store(
+        key,
+        CacheEntry(
+            expires_at=expires_at,
+            data=data,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        ),
+    )
+    return data, False
+
+
+def _discard_inflight(key: tuple[Any, ...], task: asyncio.Future[Any]) -> None:
+    """Forget a finished in-flight request, unless a newer one replaced it."""
+    if _inflight.get(key) is task:
+        del _inflight[key]
+
+
+async def make_intervals_request(
+    url: str, api_key: str | None = None, params: dict[str, Any] | None = None
+) -> tuple[dict[str, Any] | list[dict[str, Any]] | ApiError, bool]:
+    """Make a GET request to the Intervals.icu API with caching and proper error handling.
+
+    Repeated identical requests are served from memory until their TTL
+    expires, then revalidated with a conditional request. Concurrent identical
+    requests share a single call to the API. Error responses are never cached.
+
+    Returns the response and whether it is stale: a cached body up to
+    CACHE_MAX_STALE seconds past its TTL, served because the API is failing.
+    """
+    key = _cache_key(url, api_key, params)
+    entry = _cache.get(key)
+    if entry is not None:
+        age = time.monotonic() - entry.expires_at
+        if age < 0:
+            _cache.move_to_end(key)
+            return entry.data, False
+        if age > CACHE_MAX_STALE and entry.etag is None and entry.last_modified is None:
+            # Too old to serve and nothing to revalidate it with
+            del _cache[key]
+            entry = None
+
+    # Run the fetch in its own task shared by every identical request, and
+    # shield it so cancelling one caller, even the first, leaves it running
+    # for the others
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch(key, url, api_key, params, entry))
+        _inflight[key] = task
+        task.add_done_callback(functools.partial(_discard_inflight, key))
+    return await asyncio.shield(task)
+
+
+def _resolve_athlete_id(athlete_id: str | None) -> tuple[str, str | None]:
+    """Pick the given athlete ID or the ATHLETE_ID default and validate it.
+
+    Returns the athlete ID and an error message, which is None when the ID is valid.
+    Malformed IDs are rejected here instead of costing a round-trip to the API.
+    """
+    # Use provided athlete_id or fall back to global ATHLETE_ID
+    athlete_id_to_use = athlete_id if athlete_id is not None else ATHLETE_ID
+    if not athlete_id_to_use:
+        return (
+            "",
+            "Error: No athlete ID provided and no default ATHLETE_ID found in environment variables.",
+        )
+    if not ATHLETE_ID_PATTERN.fullmatch(athlete_id_to_use):
+        return (
+            athlete_id_to_use,
+            f"Error: Invalid athlete ID '{athlete_id_to_use}'. Expected a numeric ID, optionally prefixed with 'i' (e.g. i12345).",
+        )
+    return athlete_id_to_use, None
+
+
+def _stale_notice(stale: bool) -> str:
+    """Return the note that prefixes tool output built from a stale response."""
+    return STALE_NOTICE if stale else ""
+
+
+def _dispatch_result(
+    result: dict[str, Any] | list[dict[str, Any]],
+    on_list: Callable[[list[Any]], T],
+    on_dict: Callable[[dict[str, Any]], T],
+) -> T:
+    """Route a successful API response to the handler for its JSON shape."""
+    if isinstance(result, list):
+        return on_list(result)
+    return on_dict(result)
+
+
+def _wellness_list_entries(result: list[Any]) -> list[dict[str, Any]]:
+    """Return the wellness entries of a list-shaped wellness response."""
+    return [entry for entry in result if isinstance(entry, dict)]
+
+
+def _wellness_dict_entries(result: dict[str, Any]) -> list[dict[str, Any]]:
+    """Return the wellness entries of a date-keyed wellness response.
+
+    The date key is added to each entry that doesn't already have one, without
+    mutating the (possibly cached) response.
+    """
+    return [
+        {"date": date_str, **data}
+        for date_str, data in result.items()
+        if isinstance(data, dict)
+    ]
+
+
+@functools.lru_cache(maxsize=8)
+def _offset_date(days: int, minute: int) -> str:
+    """Format today's date shifted by days, the minute argument only keys the cache."""
+    return (date.today() + timedelta(days=days)).isoformat()
+
+
+def _default_date(days: int = 0) -> str:
+    """Return today's date shifted by days in YYYY-MM-DD format.
+
+    The value is reused for up to a minute so back-to-back tool calls share the
+    same default dates, and therefore the same response cache keys.
+    """
+    return _offset_date(days, int(time.time()) // 60)
+
+
+def _date_range_params(
+    start_date: str | None, end_date: str | None, default_days: tuple[int, int]
+) -> dict[str, Any]:
+    """Build the oldest/newest params shared by the athlete date range endpoints.
+
+    Missing dates default to today shifted by the matching default_days offset.
+    """
+    return {
+        "oldest": start_date or _default_date(days=default_days[0]),
+        "newest": end_date or _default_date(days=default_days[1]),
+    }
+
+
+def _older_activities_params(start_date: str, api_limit: int) -> dict[str, Any] | None:
+    """Build the params for the 60 days preceding start_date, if it is a valid date."""
+    try:
+        oldest_date = datetime.fromisoformat(start_date).date()
+    except ValueError:
+        return None
+    older_start_date = (oldest_date - timedelta(days=60)).isoformat()
+    older_end_date = (oldest_date - timedelta(days=1)).isoformat()
+    return {"oldest": older_start_date, "newest": older_end_date, "limit": api_limit}
+
+
+def _activity_items(result: dict[str, Any] | list[dict[str, Any]]) -> list[Any]:
+    """Return the raw activity items contained in an activities API response."""
+    if isinstance(result, list):
+        return result
+    # Result is a single activity or a container, use the first list found inside it
+    for value in result.values():
+        if isinstance(value, list):
+            return value
+    # If no list was found but the dict has typical activity fields, treat it as a single activity
+    if any(key in result for key in ("name", "startTime", "distance")):
+        return [result]
+    return []
+
+
+def _filter_activities(items: list[Any], include_unnamed: bool) -> list[dict[str, Any]]:
+    """Keep the activity dictionaries, dropping unnamed ones unless requested."""
+    return [
+        item
+        for item in items
+        if isinstance(item, dict)
+        and (include_unnamed or ((name := item.get("name")) and name != "Unnamed"))
+    ]
 
 
 # ----- MCP Tool Implementations ----- #
@@ -142,113 +637,75 @@ async def get_activities(
         limit: Maximum number of activities to return (optional, defaults to 10)
         include_unnamed: Whether to include unnamed activities (optional, defaults to False)
     """
-    # Use provided athlete_id or fall back to global ATHLETE_ID
-    athlete_id_to_use = athlete_id if athlete_id is not None else ATHLETE_ID
-    if not athlete_id_to_use:
-        return "Error: No athlete ID provided and no default ATHLETE_ID found in environment variables."
-
-    # Parse date parameters
-    if not start_date:
-        start_date = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
-    if not end_date:
-        end_date = datetime.now().strftime("%Y-%m-%d")
+    athlete_id_to_use, error = _resolve_athlete_id(athlete_id)
+    if error:
+        return error
 
     # Fetch more activities if we need to filter out unnamed ones
     api_limit = limit * 3 if not include_unnamed else limit
 
     # Call the Intervals.icu API
-    params = {"oldest": start_date, "newest": end_date, "limit": api_limit}
-
-    result = await make_intervals_request(
-        url=f"/athlete/{athlete_id_to_use}/activities", api_key=api_key, params=params
+    url = f"/athlete/{athlete_id_to_use}/activities"
+    params = _date_range_params(start_date, end_date, default_days=(-30, 0))
+    params["limit"] = api_limit
+
+    # Older window used to top up the list when too few activities are named
+    more_params = (
+        None
+        if include_unnamed
+        else _older_activities_params(params["oldest"], api_limit)
     )
 
+    more_result = None
+    more_stale = False
+    if more_params is not None and limit > ACTIVITIES_PREFETCH_MIN_LIMIT:
+        # Very large pages are the most likely to need the older window, so
+        # fetch both concurrently instead of paying a second round-trip later
+        (result, stale), (more_result, more_stale) = await asyncio.gather(
+            make_intervals_request(url=url, api_key=api_key, params=params),
+            make_intervals_request(url=url, api_key=api_key, params=more_params),
+        )
+    else:
+        result, stale = await make_intervals_request(
+            url=url, api_key=api_key, params=params
+        )
+
     # Check for error differently based on result type
-    if isinstance(result, dict) and "error" in result:
-        error_message = result.get("message", "Unknown error")
-        return f"Error fetching activities: {error_message}"
+    if isinstance(result, ApiError):
+        return f"Error fetching activities: {result.message}"
 
     # Format the response
     if not result:
-        return f"No activities found for athlete {athlete_id_to_use} in the specified date range."
+        return f"{_stale_notice(stale)}No activities found for athlete {athlete_id_to_use} in the specified date range."
 
-    # Ensure result is a list of activity dictionaries
-    activities: list[dict[str, Any]] = []
+    # Parse and filter the activities in a single pass
+    items = _activity_items(result)
+    activities = _filter_activities(items, include_unnamed)
 
-    if isinstance(result, list):
-        # Result is already a list
-        activities = [item for item in result if isinstance(item, dict)]
-    elif isinstance(result, dict):
-        # Result is a single activity or a container
-        for key, value in result.items():
-            if isinstance(value, list):
-                # Found a list inside the dictionary
-                activities = [item for item in value if isinstance(item, dict)]
-                break
-        # If no list was found but the dict has typical activity fields, treat it as a single activity
-        if not activities and any(
-            key in result for key in ["name", "startTime", "distance"]
-        ):
-            activities = [result]
+    if not activities and not any(isinstance(item, dict) for item in items):
+        return f"{_stale_notice(stale)}No valid activities found for athlete {athlete_id_to_use} in the specified date range."
 
-    if not activities:
-        return f"No valid activities found for athlete {athlete_id_to_use} in the specified date range."
-
-    # Filter out unnamed activities if needed and limit to requested count
-    if not include_unnamed:
-        activities = [
-            activity
-            for activity in activities
-            if activity.get("name") and activity.get("name") != "Unnamed"
-        ]
-
-        # If we don't have enough named activities, try to fetch more
-        if len(activities) < limit:
-            # Calculate how far back we need to go to get more activities
-            oldest_date = datetime.fromisoformat(start_date)
-            older_start_date = (oldest_date - timedelta(days=60)).strftime("%Y-%m-%d")
-            older_end_date = (oldest_date - timedelta(days=1)).strftime("%Y-%m-%d")
-
-            # Additional fetch if needed
-            if older_start_date < older_end_date:
-                more_params = {
-                    "oldest": older_start_date,
-                    "newest": older_end_date,
-                    "limit": api_limit,
-                }
-                more_result = await make_intervals_request(
-                    url=f"/athlete/{athlete_id_to_use}/activities",
-                    api_key=api_key,
-                    params=more_params,
-                )
-
-                if isinstance(more_result, list):
-                    more_activities = [
-                        activity
-                        for activity in more_result
-                        if isinstance(activity, dict)
-                        and activity.get("name")
-                        and activity.get("name") != "Unnamed"
-                    ]
-                    activities.extend(more_activities)
+    # If we don't have enough named activities, use the older window
+    if more_params is not None and len(activities) < limit:
+        if more_result is None:
+            more_result, more_stale = await make_intervals_request(
+                url=url, api_key=api_key, params=more_params
+            )
+        if isinstance(more_result, list):
+            activities.extend(_filter_activities(more_result, include_unnamed=False))
+            stale = stale or more_stale
 
     # Limit to requested count
     activities = activities[:limit]
 
+    notice = _stale_notice(stale)
     if not activities:
         if include_unnamed:
-            return f"No valid activities found for athlete {athlete_id_to_use} in the specified date range."
-        else:
-            return f"No named activities found for athlete {athlete_id_to_use} in the specified date range. Try with include_unnamed=True to see all activities."
-
-    activities_summary = "Activities:\n\n"
-    for activity in activities:
-        if isinstance(activity, dict):
-            activities_summary += format_activity_summary(activity) + "\n"
+            return f"{notice}No valid activities found for athlete {athlete_id_to_use} in the specified date range."
         else:
-            activities_summary += f"Invalid activity format: {activity}\n\n"
+            return f"{notice}No named activities found for athlete {athlete_id_to_use} in the specified date range. Try with include_unnamed=True to see all activities."
 
-    return activities_summary
+    return f"{notice}Activities:\n\n{format_activities(activities)}"
 
 
 @mcp.tool()
@@ -260,42 +717,43 @@ async def get_activity_details(activity_id: str, api_key: str | None = None) ->
         api_key: The Intervals.icu API key (optional, will use API_KEY from .env if not provided)
     """
     # Call the Intervals.icu API
-    result = await make_intervals_request(
+    result, stale = await make_intervals_request(
         url=f"/activity/{activity_id}", api_key=api_key
     )
 
-    if isinstance(result, dict) and "error" in result:
-        error_message = result.get("message", "Unknown error")
-        return f"Error fetching activity details: {error_message}"
+    if isinstance(result, ApiError):
+        return f"Error fetching activity details: {result.message}"
+
+    notice = _stale_notice(stale)
 
     # Format the response
     if not result:
-        return f"No details found for activity {activity_id}."
+        return f"{notice}No details found for activity {activity_id}."
 
     # If result is a list, use the first item if available
     activity_data = result[0] if isinstance(result, list) and result else result
     if not isinstance(activity_data, dict):
-        return f"Invalid activity format for activity {activity_id}."
+        return f"{notice}Invalid activity format for activity {activity_id}."
 
     # Return a more detailed view of the activity
-    detailed_view = format_activity_summary(activity_data)
+    parts: list[str] = [notice, format_activity_summary(activity_data)]
 
     # Add additional details if available
     if "zones" in activity_data:
         zones = activity_data["zones"]
-        detailed_view += "\nPower Zones:\n"
+        parts.append("\nPower Zones:\n")
         for zone in zones.get("power", []):
-            detailed_view += (
+            parts.append(
                 f"Zone {zone.get('number')}: {zone.get('secondsInZone')} seconds\n"
             )
 
-        detailed_view += "\nHeart Rate Zones:\n"
+        parts.append("\nHeart Rate Zones:\n")
         for zone in zones.get("hr", []):
-            detailed_view += (
+            parts.append(
                 f"Zone {zone.get('number')}: {zone.get('secondsInZone')} seconds\n"
             )
 
-    return detailed_view
+    return "".join(parts)
 
 
 @mcp.tool()
@@ -313,46 +771,42 @@ async def get_events(
         start_date: Start date in YYYY-MM-DD format (optional, defaults to today)
         end_date: End date in YYYY-MM-DD format (optional, defaults to 30 days from today)
     """
-    # Use provided athlete_id or fall back to global ATHLETE_ID
-    athlete_id_to_use = athlete_id if athlete_id is not None else ATHLETE_ID
-    if not athlete_id_to_use:
-        return "Error: No athlete ID provided and no default ATHLETE_ID found in environment variables."
-
-    # Parse date parameters
-    if not start_date:
-        start_date = datetime.now().strftime("%Y-%m-%d")
-    if not end_date:
-        end_date = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
+    athlete_id_to_use, error = _resolve_athlete_id(athlete_id)
+    if error:
+        return error
 
     # Call the Intervals.icu API
-    params = {"oldest": start_date, "newest": end_date}
-
-    result = await make_intervals_request(
-        url=f"/athlete/{athlete_id_to_use}/events", api_key=api_key, params=params
+    result, stale = await make_intervals_request(
+        url=f"/athlete/{athlete_id_to_use}/events",
+        api_key=api_key,
+        params=_date_range_params(start_date, end_date, default_days=(0, 30)),
     )
 
-    if isinstance(result, dict) and "error" in result:
-        error_message = result.get("message", "Unknown error")
-        return f"Error fetching events: {error_message}"
+    if isinstance(result, ApiError):
+        return f"Error fetching events: {result.message}"
+
+    notice = _stale_notice(stale)
 
     # Format the response
     if not result:
-        return f"No events found for athlete {athlete_id_to_use} in the specified date range."
+        return f"{notice}No events found for athlete {athlete_id_to_use} in the specified date range."
 
-    # Ensure result is a list
-    events = result if isinstance(result, list) else []
+    # Only a list of events is a valid response
+    events = _dispatch_result(result, on_list=lambda items: items, on_dict=lambda _: [])
 
     if not events:
-        return f"No events found for athlete {athlete_id_to_use} in the specified date range."
+        return f"{notice}No events found for athlete {athlete_id_to_use} in the specified date range."
 
-    events_summary = "Events:\n\n"
+    parts: list[str] = [notice, "Events:\n\n"]
+    # Bind the formatter locally to skip a global lookup per event
+    format_event = format_event_summary
     for event in events:
         if not isinstance(event, dict):
             continue
 
-        events_summary += format_event_summary(event) + "\n\n"
+        parts.extend((format_event(event), "\n\n"))
 
-    return events_summary
+    return "".join(parts)
 
 
 @mcp.tool()
@@ -368,28 +822,28 @@ async def get_event_by_id(
         athlete_id: The Intervals.icu athlete ID (optional, will use ATHLETE_ID from .env if not provided)
         api_key: The Intervals.icu API key (optional, will use API_KEY from .env if not provided)
     """
-    # Use provided athlete_id or fall back to global ATHLETE_ID
-    athlete_id_to_use = athlete_id if athlete_id is not None else ATHLETE_ID
-    if not athlete_id_to_use:
-        return "Error: No athlete ID provided and no default ATHLETE_ID found in environment variables."
+    athlete_id_to_use, error = _resolve_athlete_id(athlete_id)
+    if error:
+        return error
 
     # Call the Intervals.icu API
-    result = await make_intervals_request(
+    result, stale = await make_intervals_request(
         url=f"/athlete/{athlete_id_to_use}/event/{event_id}", api_key=api_key
     )
 
-    if isinstance(result, dict) and "error" in result:
-        error_message = result.get("message", "Unknown error")
-        return f"Error fetching event details: {error_message}"
+    if isinstance(result, ApiError):
+        return f"Error fetching event details: {result.message}"
+
+    notice = _stale_notice(stale)
 
     # Format the response
     if not result:
-        return f"No details found for event {event_id}."
+        return f"{notice}No details found for event {event_id}."
 
     if not isinstance(result, dict):
-        return f"Invalid event format for event {event_id}."
+        return f"{notice}Invalid event format for event {event_id}."
 
-    return format_event_details(result)
+    return f"{notice}{format_event_details(result)}"
 
 
 @mcp.tool()
@@ -407,46 +861,38 @@ async def get_wellness_data(
         start_date: Start date in YYYY-MM-DD format (optional, defaults to 30 days ago)
         end_date: End date in YYYY-MM-DD format (optional, defaults to today)
     """
-    # Use provided athlete_id or fall back to global ATHLETE_ID
-    athlete_id_to_use = athlete_id if athlete_id is not None else ATHLETE_ID
-    if not athlete_id_to_use:
-        return "Error: No athlete ID provided and no default ATHLETE_ID found in environment variables."
-
-    # Parse date parameters
-    if not start_date:
-        start_date = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
-    if not end_date:
-        end_date = datetime.now().strftime("%Y-%m-%d")
+    athlete_id_to_use, error = _resolve_athlete_id(athlete_id)
+    if error:
+        return error
 
     # Call the Intervals.icu API
-    params = {"oldest": start_date, "newest": end_date}
-
-    result = await make_intervals_request(
-        url=f"/athlete/{athlete_id_to_use}/wellness", api_key=api_key, params=params
+    result, stale = await make_intervals_request(
+        url=f"/athlete/{athlete_id_to_use}/wellness",
+        api_key=api_key,
+        params=_date_range_params(start_date, end_date, default_days=(-30, 0)),
     )
 
-    if isinstance(result, dict) and "error" in result:
-        return f"Error fetching wellness data: {result.get('message')}"
+    if isinstance(result, ApiError):
+        return f"Error fetching wellness data: {result.message}"
+
+    notice = _stale_notice(stale)
 
     # Format the response
     if not result:
-        return f"No wellness data found for athlete {athlete_id_to_use} in the specified date range."
-
-    wellness_summary = "Wellness Data:\n\n"
+        return f"{notice}No wellness data found for athlete {athlete_id_to_use} in the specified date range."
 
     # Handle both list and dictionary responses
-    if isinstance(result, dict):
-        for date_str, data in result.items():
-            # Add the date to the data dictionary if it's not already presen
-            if isinstance(data, dict) and "date" not in data:
-                data["date"] = date_str
-            wellness_summary += format_wellness_entry(data) + "\n\n"
-    elif isinstance(result, list):
-        for entry in result:
-            if isinstance(entry, dict):
-                wellness_summary += format_wellness_entry(entry) + "\n\n"
+    entries = _dispatch_result(
+        result, on_list=_wellness_list_entries, on_dict=_wellness_dict_entries
+    )
+
+    parts: list[str] = [notice, "Wellness Data:\n\n"]
+    # Bind the formatter locally to skip a global lookup per entry
+    format_entry = format_wellness_entry
+    for entry in entries:
+        parts.extend((format_entry(entry), "\n\n"))
 
-    return wellness_summary
+    return "".join(parts)
 
 
 @mcp.tool()
@@ -461,26 +907,27 @@ async def get_activity_intervals(activity_id: str, api_key: str | None = None) -
         api_key: The Intervals.icu API key (optional, will use API_KEY from .env if not provided)
     """
     # Call the Intervals.icu API
-    result = await make_intervals_request(
+    result, stale = await make_intervals_request(
         url=f"/activity/{activity_id}/intervals", api_key=api_key
     )
 
-    if isinstance(result, dict) and "error" in result:
-        error_message = result.get("message", "Unknown error")
-        return f"Error fetching intervals: {error_message}"
+    if isinstance(result, ApiError):
+        return f"Error fetching intervals: {result.message}"
+
+    notice = _stale_notice(stale)
 
     # Format the response
     if not result:
-        return f"No interval data found for activity {activity_id}."
+        return f"{notice}No interval data found for activity {activity_id}."
 
     # If the result is empty or doesn't contain expected fields
     if not isinstance(result, dict) or not any(
         key in result for key in ["icu_intervals", "icu_groups"]
     ):
-        return f"No interval data or unrecognized format for activity {activity_id}."
+        return f"{notice}No interval data or unrecognized format for activity {activity_id}."
 
     # Format the intervals data
-    return format_intervals(result)
+    return f"{notice}{format_intervals(result)}"
 
 
 # Run the server
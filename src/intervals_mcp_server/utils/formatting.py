@@ -5,20 +5,39 @@ This module contains formatting functions for handling data from the Intervals.i
 """
 
 from datetime import datetime
+from functools import lru_cache
 from typing import Any
 
 
+@lru_cache(maxsize=4096)
+def _iso_to_display(value: str) -> str:
+    """Format a full ISO datetime string as "YYYY-MM-DD HH:MM:SS".
+
+    Activity lists repeat the same timestamps across calls, so results are
+    cached. Strings that aren't ISO datetimes are returned unchanged.
+    """
+    if (
+        len(value) >= 19
+        and value[4] == value[7] == "-"
+        and value[10] in "T "
+        and value[13] == value[16] == ":"
+    ):
+        # The date and time fields are already in display order
+        return f"{value[:10]} {value[11:19]}"
+    # Python 3.10 fromisoformat doesn't accept a "Z" suffix
+    iso = f"{value[:-1]}+00:00" if value.endswith("Z") else value
+    try:
+        return datetime.fromisoformat(iso).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return value
+
+
 def format_activity_summary(activity: dict[str, Any]) -> str:
     """Format an activity into a readable string."""
     start_time = activity.get("startTime", activity.get("start_date", "Unknown"))
 
     if isinstance(start_time, str) and len(start_time) > 10:
-        # Format datetime if it's a full ISO string
-        try:
-            dt = datetime.fromisoformat(start_time.replace("Z", "+00:00"))
-            start_time = dt.strftime("%Y-%m-%d %H:%M:%S")
-        except ValueError:
-            pass
+        start_time = _iso_to_display(start_time)
 
     return f"""
 Activity: {activity.get("name", "Unnamed")}
@@ -87,6 +106,13 @@ File Type: {activity.get("file_type", "N/A")}
 """
 
 
+def format_activities(activities: list[dict[str, Any]]) -> str:
+    """Format a list of activities into a single readable string."""
+    return "".join(
+        [f"{format_activity_summary(activity)}\n" for activity in activities]
+    )
+
+
 def format_workout(workout: dict[str, Any]) -> str:
     """Format a workout into a readable string."""
     return f"""
@@ -95,10 +121,21 @@ Description: {workout.get("description", "No description")}
 Sport: {workout.get("sport", "Unknown")}
 Duration: {workout.get("duration", 0)} seconds
 TSS: {workout.get("tss", "N/A")}
-Intervals: {len(workout.get("intervals", []))}
+Intervals: {len(workout.get("intervals") or ())}
 """
 
 
+@lru_cache(maxsize=32)
+def _menstrual_phase(phase: str | None) -> str:
+    """Capitalize a menstrual phase name, or return "N/A" when it is missing.
+
+    Phases come from a handful of names, so results are cached.
+    """
+    if phase is None or phase == "N/A":
+        return "N/A"
+    return phase.capitalize()
+
+
 def format_wellness_entry(entry: dict[str, Any]) -> str:
     """Format a wellness data entry into a readable string with all available fields."""
 
@@ -113,32 +150,18 @@ def format_wellness_entry(entry: dict[str, Any]) -> str:
         sleep_hours = f"{entry.get('sleepHours')}"
 
     # Format menstrual phase with proper capitalization if present
-    menstrual_phase = entry.get("menstrualPhase", "N/A")
-    if menstrual_phase != "N/A" and menstrual_phase is not None:
-        menstrual_phase = menstrual_phase.capitalize()
-    else:
-        menstrual_phase = "N/A"
-
-    menstrual_phase_predicted = entry.get("menstrualPhasePredicted", "N/A")
-    if menstrual_phase_predicted != "N/A" and menstrual_phase_predicted is not None:
-        menstrual_phase_predicted = menstrual_phase_predicted.capitalize()
-    else:
-        menstrual_phase_predicted = "N/A"
+    menstrual_phase = _menstrual_phase(entry.get("menstrualPhase"))
+    menstrual_phase_predicted = _menstrual_phase(entry.get("menstrualPhasePredicted"))
 
     # Format sport information if available
-    sport_info_list = []
-    if entry.get("sportInfo"):
-        for sport in entry.get("sportInfo", []):
-            if isinstance(sport, dict):
-                sport_info_list.append(
-                    f"  * {sport.get('type', 'Unknown')}: eFTP = {sport.get('eftp', 'N/A')}"
-                )
-
-    # Create sport info string
-    if sport_info_list:
-        sport_info = "\n".join(sport_info_list)
-    else:
-        sport_info = "  None available"
+    sport_info = (
+        "\n".join(
+            f"  * {sport.get('type', 'Unknown')}: eFTP = {sport.get('eftp', 'N/A')}"
+            for sport in entry.get("sportInfo") or ()
+            if isinstance(sport, dict)
+        )
+        or "  None available"
+    )
 
     return f"""Date: {entry.get("date", "Unknown date")}
 ID: {entry.get("id", "N/A")}
@@ -271,19 +294,26 @@ def format_intervals(intervals_data: dict[str, Any]) -> str:
     Returns:
         A formatted string representation of the intervals data
     """
+    intervals = intervals_data.get("icu_intervals")
+    groups = intervals_data.get("icu_groups")
+
     # Format basic intervals information
-    result = f"""Intervals Analysis:
+    header = f"""Intervals Analysis:
 
 ID: {intervals_data.get("id", "N/A")}
 Analyzed: {intervals_data.get("analyzed", "N/A")}
 
 """
+    # Not analyzed yet, there is nothing else to format
+    if not intervals and not groups:
+        return header
+    parts = [header]
 
     # Format individual intervals
-    if "icu_intervals" in intervals_data and intervals_data["icu_intervals"]:
-        result += "Individual Intervals:\n\n"
+    if intervals:
+        parts.append("Individual Intervals:\n\n")
 
-        for i, interval in enumerate(intervals_data["icu_intervals"], 1):
+        for i, interval in enumerate(intervals, 1):
             interval_type = interval.get("type", "Unknown")
             label = interval.get("label", f"Interval {i}")
 
@@ -315,7 +345,7 @@ Analyzed: {intervals_data.get("analyzed", "N/A")}
             avg_speed = interval.get("average_speed", 0)
             max_speed = interval.get("max_speed", 0)
 
-            result += f"""[{i}] {label} ({interval_type})
+            parts.append(f"""[{i}] {label} ({interval_type})
 Duration: {elapsed_time} seconds (moving: {moving_time} seconds)
 Distance: {distance} meters
 Start-End Indices: {interval.get("start_index", 0)}-{interval.get("end_index", 0)}
@@ -357,13 +387,13 @@ Elevation & Environment:
   Wind: Speed {interval.get("average_wind_speed", 0)} km/h, Gust {interval.get("average_wind_gust", 0)} km/h, Direction {interval.get("prevailing_wind_deg", 0)}°
   Headwind: {interval.get("headwind_percent", 0)}%, Tailwind: {interval.get("tailwind_percent", 0)}%
 
-"""
+""")
 
     # Format interval groups
-    if "icu_groups" in intervals_data and intervals_data["icu_groups"]:
-        result += "Interval Groups:\n\n"
+    if groups:
+        parts.append("Interval Groups:\n\n")
 
-        for i, group in enumerate(intervals_data["icu_groups"], 1):
+        for i, group in enumerate(groups, 1):
             group_id = group.get("id", f"Group {i}")
 
             # Format basic group information
@@ -380,7 +410,7 @@ Elevation & Environment:
             w_avg = group.get("weighted_average_watts", 0)
             intensity = group.get("intensity", 0)
 
-            result += f"""Group: {group_id} (Contains {count} intervals)
+            parts.append(f"""Group: {group_id} (Contains {count} intervals)
 Duration: {elapsed_time} seconds (moving: {moving_time} seconds)
 Distance: {distance} meters
 Start-End Indices: {group.get("start_index", 0)}-N/A
@@ -391,6 +421,6 @@ Heart Rate: Avg {group.get("average_heartrate", 0)}, Max {group.get("max_heartra
 Speed: Avg {group.get("average_speed", 0)}, Max {group.get("max_speed", 0)} m/s
 Cadence: Avg {group.get("average_cadence", 0)}, Max {group.get("max_cadence", 0)} rpm
 
-"""
+""")
 
-    return result
+    return "".join(parts)
@@ -0,0 +1,310 @@
+"""
+Tests for the shared request machinery in server.py
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import server
+
+URL = "/athlete/i1/activities"
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Start every test with an empty cache and no requests in flight."""
+    server._cache.clear()
+    server._inflight.clear()
+    yield
+    server._cache.clear()
+    server._inflight.clear()
+
+
+@pytest.fixture
+def slow_fetch(monkeypatch):
+    """Replace _fetch with one that waits to be released and counts its calls."""
+    state = {"calls": 0, "cancelled": False}
+    release = asyncio.Event()
+
+    async def fake_fetch(key, url, api_key, params, stale):
+        state["calls"] += 1
+        try:
+            await release.wait()
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+        return [{"id": 1, "name": "Ride"}], False
+
+    monkeypatch.setattr(server, "_fetch", fake_fetch)
+    state["release"] = release
+    return state
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    """Retry immediately instead of sleeping between attempts."""
+    monkeypatch.setattr(server, "_retry_delay", lambda attempt, retry_after=None: 0.0)
+
+
+async def _send_with(monkeypatch, handler):
+    """Run _send_request against a mock transport calling handler."""
+    transport = httpx.MockTransport(handler)
+    async with httpx.AsyncClient(transport=transport) as client:
+        monkeypatch.setattr(server, "_http_client", client)
+        return await server._send_request("http://test/x", None, None, {})
+
+
+async def test_concurrent_requests_share_one_fetch(slow_fetch):
+    first = asyncio.ensure_future(server.make_intervals_request(URL))
+    second = asyncio.ensure_future(server.make_intervals_request(URL))
+    await asyncio.sleep(0)
+    slow_fetch["release"].set()
+
+    first, second = await asyncio.gather(first, second)
+
+    assert first == second == ([{"id": 1, "name": "Ride"}], False)
+    assert slow_fetch["calls"] == 1
+    assert not server._inflight
+
+
+async def test_cancelled_waiter_leaves_originator_running(slow_fetch):
+    originator = asyncio.ensure_future(server.make_intervals_request(URL))
+    waiter = asyncio.ensure_future(server.make_intervals_request(URL))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.sleep(0)
+    slow_fetch["release"].set()
+
+    result = await originator
+
+    assert result == ([{"id": 1, "name": "Ride"}], False)
+    assert waiter.cancelled()
+    assert not slow_fetch["cancelled"]
+
+
+async def test_cancelled_originator_leaves_waiter_running(slow_fetch):
+    originator = asyncio.ensure_future(server.make_intervals_request(URL))
+    waiter = asyncio.ensure_future(server.make_intervals_request(URL))
+    await asyncio.sleep(0)
+    originator.cancel()
+    await asyncio.sleep(0)
+    slow_fetch["release"].set()
+
+    result = await waiter
+
+    assert result == ([{"id": 1, "name": "Ride"}], False)
+    assert originator.cancelled()
+    assert not slow_fetch["cancelled"]
+    assert slow_fetch["calls"] == 1
+
+
+async def test_lifespan_closes_client_after_last_session():
+    client = server.get_http_client()
+    async with server.lifespan(server.mcp):
+        async with server.lifespan(server.mcp):
+            pass
+        # Another session is still running and using the client
+        assert not client.is_closed
+
+    assert client.is_closed
+
+
+def _expired_entry(seconds_ago):
+    """Cache an activity intervals response that expired the given seconds ago."""
+    key = server._cache_key("/activity/1/intervals", None, None)
+    server._cache[key] = server.CacheEntry(
+        expires_at=time.monotonic() - seconds_ago,
+        data={"id": 1, "name": "Ride", "icu_intervals": [{"type": "WORK"}]},
+        etag='"v1"',
+    )
+
+
+@pytest.fixture
+def failing_api(monkeypatch):
+    """Make every request to the API fail with a 500."""
+
+    async def fake_send_request(url, api_key, params, headers):
+        return server.ApiError(message="server error", status_code=500)
+
+    monkeypatch.setattr(server, "_send_request", fake_send_request)
+
+
+async def test_stale_response_is_marked_while_api_fails(failing_api):
+    _expired_entry(60)
+
+    result = await server.get_activity_intervals("1")
+
+    assert result.startswith(server.STALE_NOTICE)
+    assert "Intervals Analysis:" in result
+
+
+async def test_too_stale_response_is_not_served(failing_api):
+    _expired_entry(server.CACHE_MAX_STALE + 60)
+
+    result = await server.get_activity_intervals("1")
+
+    assert result == "Error fetching intervals: server error"
+
+
+async def test_not_modified_response_reuses_cached_body(monkeypatch):
+    _expired_entry(60)
+    sent_headers = {}
+
+    async def fake_send_request(url, api_key, params, headers):
+        sent_headers.update(headers)
+        return httpx.Response(304)
+
+    monkeypatch.setattr(server, "_send_request", fake_send_request)
+
+    data, stale = await server.make_intervals_request("/activity/1/intervals")
+
+    assert data["name"] == "Ride"
+    assert not stale
+    assert sent_headers == {"If-None-Match": '"v1"'}
+
+
+async def test_rate_limited_retry_pauses_for_the_same_delay(monkeypatch):
+    responses = iter([httpx.Response(429), httpx.Response(200, json={"id": 1})])
+    delays = []
+    pauses = []
+
+    def fake_retry_delay(attempt, retry_after=None):
+        delays.append(0.01 * (len(delays) + 1))
+        return delays[-1]
+
+    monkeypatch.setattr(server, "_retry_delay", fake_retry_delay)
+    monkeypatch.setattr(server.TokenBucket, "pause", lambda self, s: pauses.append(s))
+
+    response = await _send_with(monkeypatch, lambda request: next(responses))
+
+    assert response.status_code == 200
+    assert delays == pauses == [0.01]
+
+
+async def test_default_activities_call_makes_one_request(monkeypatch):
+    requested = []
+    named = [{"id": i, "name": f"Ride {i}"} for i in range(10)]
+
+    async def fake_request(url, api_key=None, params=None):
+        requested.append(params)
+        return named, False
+
+    monkeypatch.setattr(server, "make_intervals_request", fake_request)
+
+    result = await server.get_activities(athlete_id="i1")
+
+    assert result.startswith("Activities:")
+    assert len(requested) == 1
+
+
+async def test_long_retry_after_pauses_bucket_and_gives_up(monkeypatch):
+    attempts = []
+    pauses = []
+
+    def handler(request):
+        attempts.append(request)
+        return httpx.Response(429, headers={"Retry-After": "60"})
+
+    monkeypatch.setattr(server.TokenBucket, "pause", lambda self, s: pauses.append(s))
+
+    error = await _send_with(monkeypatch, handler)
+
+    assert isinstance(error, server.ApiError)
+    assert error.status_code == 429
+    assert len(attempts) == 1
+    assert pauses == [60.0]
+
+
+async def test_stale_response_is_served_when_api_is_unreachable(monkeypatch):
+    _expired_entry(60)
+
+    async def fake_send_request(url, api_key, params, headers):
+        return server._exception_error(httpx.ConnectError("boom"))
+
+    monkeypatch.setattr(server, "_send_request", fake_send_request)
+
+    result = await server.get_activity_intervals("1")
+
+    assert result.startswith(server.STALE_NOTICE)
+
+
+@pytest.mark.parametrize("status_code", [502, 503, 504])
+async def test_transient_status_is_retried(monkeypatch, no_backoff, status_code):
+    responses = iter([httpx.Response(status_code), httpx.Response(200, json={})])
+
+    response = await _send_with(monkeypatch, lambda request: next(responses))
+
+    assert response.status_code == 200
+
+
+async def test_retries_stop_after_max_retries(monkeypatch, no_backoff):
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        if len(attempts) == 1:
+            raise httpx.ConnectError("boom")
+        return httpx.Response(503)
+
+    error = await _send_with(monkeypatch, handler)
+
+    assert len(attempts) == server.MAX_RETRIES + 1
+    assert isinstance(error, server.ApiError)
+    assert error.status_code == 503
+
+
+@pytest.mark.parametrize(
+    "outcome",
+    [httpx.Response(404), httpx.Response(401), httpx.ReadTimeout("slow")],
+)
+async def test_client_errors_and_read_timeouts_are_not_retried(
+    monkeypatch, no_backoff, outcome
+):
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    error = await _send_with(monkeypatch, handler)
+
+    assert len(attempts) == 1
+    assert isinstance(error, server.ApiError)
+
+
+@pytest.mark.parametrize("athlete_id", ["", "abc", "i12x", "12/../34"])
+def test_malformed_athlete_ids_are_rejected(monkeypatch, athlete_id):
+    monkeypatch.setattr(server, "ATHLETE_ID", "")
+
+    _, error = server._resolve_athlete_id(athlete_id)
+
+    assert error is not None
+    assert error.startswith("Error:")
+
+
+@pytest.mark.parametrize("athlete_id", ["12345", "i12345"])
+def test_valid_athlete_ids_are_accepted(athlete_id):
+    assert server._resolve_athlete_id(athlete_id) == (athlete_id, None)
+
+
+async def test_cache_evicts_least_recently_used_entry(monkeypatch):
+    monkeypatch.setattr(server, "CACHE_MAXSIZE", 2)
+    keys = {url: server._cache_key(url, None, None) for url in ("/a", "/b", "/c")}
+    for url in ("/a", "/b"):
+        server._cache_store(
+            keys[url],
+            server.CacheEntry(expires_at=time.monotonic() + 60, data={"url": url}),
+        )
+
+    # A cache hit on /a leaves /b as the least recently used entry
+    await server.make_intervals_request("/a")
+    server._cache_store(
+        keys["/c"], server.CacheEntry(expires_at=time.monotonic() + 60, data={})
+    )
+
+    assert list(server._cache) == [keys["/a"], keys["/c"]]